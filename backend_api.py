@@ -1,13 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, Response
 from flask_cors import CORS
+from werkzeug.http import http_date
 import pandas as pd
 import numpy as np
+import orjson
+import openpyxl
 import re
-from pathlib import Path
-import tempfile
+import io
+import datetime
+import decimal
+import hashlib
+import threading
+from collections import OrderedDict
 import os
+import logging
 import traceback
-from werkzeug.utils import secure_filename
 
 
 def parse_float(value, default=0.0):
@@ -25,6 +32,45 @@ def parse_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
+def parse_float_rows(rows):
+    """
+    2-D float64 array from rows of raw JSON values (falsy values already mapped to 0).
+    numpy converts numbers and numeric strings in C; parse_float is only used per value
+    when some cell can't be converted
+    """
+    try:
+        values = np.array(rows, dtype=np.float64)
+        if values.ndim == 2:
+            return values
+    except (ValueError, TypeError):
+        pass
+    return np.array([[parse_float(v) or 0 for v in row] for row in rows], dtype=np.float64)
+
+def stable_smallest(values, k):
+    """
+    Indices of the k smallest values, identical to np.argsort(values, kind="stable")[:k]
+    (ties resolved by position) but only partitioning instead of sorting the whole array
+    """
+    kth = np.partition(values, k - 1)[k - 1]
+    if np.isnan(kth):
+        # NaNs sort last; with fewer than k real values just sort everything
+        return np.argsort(values, kind="stable")[:k]
+    below = np.flatnonzero(values < kth)
+    ties = np.flatnonzero(values == kth)[:k - below.size]
+    # Both index lists are ascending, so the stable sort keeps position order within ties
+    order = np.concatenate([below, ties])
+    return order[np.argsort(values[order], kind="stable")]
+
+# INFO/DEBUG chatter is off by default (LOG_LEVEL=INFO or DEBUG to see it), so the
+# hot path only pays a level check per message
+LOG_LEVEL = (os.environ.get('LOG_LEVEL') or 'WARNING').upper()
+# An unknown name would make basicConfig raise at import and take the function down
+_log_level_valid = isinstance(logging.getLevelName(LOG_LEVEL), int)
+logging.basicConfig(level=LOG_LEVEL if _log_level_valid else 'WARNING', format="[%(levelname)s] %(message)s")
+log = logging.getLogger(__name__)
+if not _log_level_valid:
+    log.warning("Unknown LOG_LEVEL %r, using WARNING", LOG_LEVEL)
+
 app = Flask(__name__)
 
 # Enable CORS for frontend communication
@@ -39,41 +85,166 @@ else:
     CORS(app, origins=allowed_origins, supports_credentials=True)
 
 # Configuration
-# Use /tmp for serverless environments (Vercel, AWS Lambda, etc.)
 # Detect serverless environment
 IS_SERVERLESS = os.environ.get('VERCEL') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME') or os.environ.get('FUNCTION_TARGET')
 
-UPLOAD_FOLDER = os.environ.get(
-    'UPLOAD_FOLDER',
-    os.path.join(tempfile.gettempdir(), 'uploads') if IS_SERVERLESS else 'uploads'
-)
-ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+ALLOWED_EXTENSIONS = frozenset({'.xlsx', '.xls', '.csv'})
+
+# Formatting a traceback walks the whole stack and leaks internals, so error
+# responses only carry one when DEBUG_TRACEBACKS=1
+DEBUG_TRACEBACKS = os.environ.get('DEBUG_TRACEBACKS') == '1'
 
-# Create upload directory if it doesn't exist
+# Raw layouts are only scanned over their first rows
+RAW_ROW_LIMIT = 1000
+# Rows searched for an exact 'PARTICULARS' header before the rest of the sheet is normalized
+HEADER_SCAN_ROWS = 50
+
+# Successful /process-file results for recently uploaded file contents (0 disables)
 try:
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-except Exception as e:
-    print(f"[WARNING] Could not create upload directory: {e}")
-    # Fallback to system temp directory
-    UPLOAD_FOLDER = tempfile.gettempdir()
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE') or 32)
+except ValueError:
+    log.warning("Invalid RESULT_CACHE_SIZE %r, using 32", os.environ.get('RESULT_CACHE_SIZE'))
+    RESULT_CACHE_SIZE = 32
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+
+def upload_digest(content):
+    """
+    Cache key for an upload's bytes (BLAKE2b is in hashlib and faster than SHA-2)
+    """
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+def get_cached_result(key):
+    with _result_cache_lock:
+        result = _result_cache.get(key)
+        if result is not None:
+            _result_cache.move_to_end(key)
+        return result
+
+def cache_result(key, result):
+    if RESULT_CACHE_SIZE <= 0:
+        return
+    with _result_cache_lock:
+        _result_cache[key] = result
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+def error_result(message):
+    """
+    Failed-result payload for the current exception (traceback only with DEBUG_TRACEBACKS).
+    The failure is always logged at ERROR; the traceback is only attached (and therefore
+    formatted) with DEBUG_TRACEBACKS or DEBUG logging
+    """
+    log.error(message, exc_info=DEBUG_TRACEBACKS or log.isEnabledFor(logging.DEBUG))
+    result = {"success": False, "error": message}
+    if DEBUG_TRACEBACKS:
+        result["traceback"] = traceback.format_exc()
+    return result
+
+def _json_default(obj):
+    """
+    orjson fallback for values it can't encode natively. Float NaN is already written
+    as null, but pandas' other missing markers (NaT, NA) land here and become null too.
+    Dates/Timestamps and Decimals are written the way Flask's jsonify did; anything
+    else is an error rather than a silently stringified value
+    """
+    if pd.api.types.is_scalar(obj) and pd.isna(obj):
+        return None
+    if isinstance(obj, datetime.date):
+        return http_date(obj)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def json_response(payload):
+    """
+    JSON response encoded with orjson (numpy scalars/arrays supported, missing values become null)
+    """
+    body = orjson.dumps(
+        payload,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME,
+        default=_json_default
+    )
+    return Response(body, mimetype="application/json")
+
+def open_workbook(file_path):
+    """
+    Open a workbook in openpyxl read-only mode so rows are streamed from the XML
+    instead of building the full cell model in memory
+    """
+    return openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+
+def get_sheet(wb, sheet_name=None):
+    """
+    Worksheet by name (default: the first one), ready to stream.
+    Read-only rows are padded/cut to the sheet's declared <dimension>, which can be
+    stale, so it is reset (as pd.read_excel does) and rows run to their real extent
+    """
+    ws = wb[sheet_name] if sheet_name is not None else wb.worksheets[0]
+    ws.reset_dimensions()
+    return ws
+
+def read_raw_sheet(wb, sheet_name=None, max_rows=RAW_ROW_LIMIT):
+    """
+    Read the first 'max_rows' rows of a worksheet (default: the first one) with no
+    header, preserving the raw layout like pd.read_excel(header=None, nrows=max_rows)
+    """
+    ws = get_sheet(wb, sheet_name)
+    rows = list(ws.iter_rows(max_row=max_rows, values_only=True))
+    # Sheets are often formatted far below the data; drop the trailing blank rows
+    # (as read_excel does) so header detection and extraction only see the used area
+    while rows and rows[-1].count(None) == len(rows[-1]):
+        rows.pop()
+    return pd.DataFrame(rows)
+
+def read_header_row(wb, sheet_name=None):
+    """
+    Read only the first row of a worksheet (default: the first one) as a list of values
+    """
+    ws = get_sheet(wb, sheet_name)
+    return list(next(ws.iter_rows(values_only=True, max_row=1), ()))
 
 # ------------------------------
 # Helper functions from data_backend.py
 # ------------------------------
+# Compiled once at import; these run for every cell / column label
+_WS_RE = re.compile(r"\s+")
+_MONTH_RE = re.compile(r"^[A-Za-z]+-\d{2}(?:\.\d+)?$")
+_PCT_RE = re.compile(r"^%(?:\.\d+)?$")
+# NBSP -> space, zero-widths removed, in a single str.translate pass
+_ZW_TABLE = str.maketrans({"\xa0": " ", "\u200b": "", "\u200c": "", "\u200d": ""})
+
 def norm_str(x):
     if pd.isna(x):
         return ""
-    s = str(x)
     # remove NBSP & zero-widths; collapse whitespace
-    s = s.replace("\xa0"," ").replace("\u200b","").replace("\u200c","").replace("\u200d","")
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
+    s = str(x).translate(_ZW_TABLE)
+    return _WS_RE.sub(" ", s).strip()
+
+def norm_series(s):
+    """
+    Vectorized norm_str for a Series/Index of strings (NaN must already be filled)
+    """
+    return s.str.translate(_ZW_TABLE).str.replace(_WS_RE, " ", regex=True).str.strip()
 
-def norm_upper(x):
-    return norm_str(x).upper()
+def norm_cells(df, upper=False):
+    """
+    Apply norm_str (upper-cased with upper=True) to every cell of a frame, returning a 2-D object array.
+    Sheets are mostly blank, so only the non-empty cells go through the string ops and
+    are scattered into a grid of ""
+    """
+    vals = df.to_numpy(dtype=object)
+    filled = pd.notna(vals)
+    normed = norm_series(pd.Series(vals[filled], dtype=object).astype(str))
+    if upper:
+        normed = normed.str.upper()
+    cells = np.full(vals.shape, "", dtype=object)
+    cells[filled] = normed.to_numpy()
+    return cells
 
 def detect_header(df0):
     """
@@ -82,39 +253,48 @@ def detect_header(df0):
       B) substring 'PARTICULARS'
       C) fallback: row with most Month-YY tokens
     """
-    # Apply norm_upper to all cells
-    df_str = df0.copy()
-    for col in df_str.columns:
-        df_str[col] = df_str[col].apply(lambda x: norm_upper(x) if pd.notna(x) else "")
-
-    # A) exact
-    eq_pos = list(zip(*np.where(df_str.values == "PARTICULARS")))
-    if eq_pos:
-        return int(eq_pos[0][0]), int(eq_pos[0][1])
-
-    # B) contains
-    has_pos = list(zip(*np.where(df_str.apply(lambda s: isinstance(s, str) and "PARTICULARS" in s, axis=1).values)))
-    if has_pos:
-        return int(has_pos[0][0]), int(has_pos[0][1])
-
-    # C) fallback
-    month_re = re.compile(r"^[A-Z]+-\d{2}(?:\.\d+)?$")
-    counts = [ sum(bool(month_re.match(v)) for v in df_str.iloc[i]) for i in range(df_str.shape[0]) ]
+    # A) exact - the header sits near the top of the sheet, so normalize and search
+    # that slice first and only normalize the rest when it holds no match
+    cells = norm_cells(df0.iloc[:HEADER_SCAN_ROWS], upper=True)
+    rows, cols = np.where(cells == "PARTICULARS")
+    if rows.size:
+        return int(rows[0]), int(cols[0])
+
+    if len(df0) > HEADER_SCAN_ROWS:
+        rest = norm_cells(df0.iloc[HEADER_SCAN_ROWS:], upper=True)
+        rows, cols = np.where(rest == "PARTICULARS")
+        if rows.size:
+            return int(rows[0]) + HEADER_SCAN_ROWS, int(cols[0])
+        cells = np.vstack([cells, rest])
+
+    # B) contains (only the non-empty cells are searched)
+    filled = cells != ""
+    has_part = np.zeros(cells.shape, dtype=bool)
+    has_part[filled] = pd.Series(cells[filled], dtype=object).str.contains("PARTICULARS", regex=False).to_numpy(dtype=bool)
+    rows, cols = np.where(has_part)
+    if rows.size:
+        return int(rows[0]), int(cols[0])
+
+    # C) fallback: count Month-YY tokens per row, matching only the non-empty cells
+    month_hits = np.zeros(cells.shape, dtype=bool)
+    month_hits[filled] = pd.Series(cells[filled], dtype=object).str.match(_MONTH_RE).to_numpy(dtype=bool)
+    counts = month_hits.sum(axis=1)
     hdr_row = int(np.argmax(counts))
-    row_vals = list(df_str.iloc[hdr_row])
+    row_vals = list(cells[hdr_row])
     if "PARTICULARS" in row_vals:
         part_col = row_vals.index("PARTICULARS")
     else:
         part_col = next((j for j, v in enumerate(row_vals) if norm_str(v)), 0)
     return hdr_row, part_col
 
-def get_name(df_raw, base_row, base_col, max_up=6, max_dx=2):
+def get_name(cells, base_row, base_col, max_up=6, max_dx=2):
     """
     Find a non-empty text near (base_row, base_col) by scanning up to 'max_up' rows
     upwards and +/- 'max_dx' columns laterally (0, -1, +1, -2, +2).
     Handles merged headers and slight misalignments.
+    'cells' is the already normalized grid above the header (see norm_cells).
     """
-    h, w = df_raw.shape
+    h, w = cells.shape
     for up in range(0, max_up + 1):
         r = base_row - up
         if r < 0:
@@ -122,187 +302,201 @@ def get_name(df_raw, base_row, base_col, max_up=6, max_dx=2):
         for dx in [0, -1, 1, -2, 2]:
             c = base_col + dx
             if 0 <= c < w:
-                v = norm_str(df_raw.iat[r, c])
+                v = cells[r, c]
                 if v:
                     return v
     return ""
 
-def process_outlet_wise_worksheet(file_path):
+def extract_outlet_records(df0):
+    """
+    Turn a raw P&L sheet (read with no header) into one row per outlet with the
+    required metrics, shared by the 'Outlet wise' and single-sheet raw paths
+    """
+    # Detect header row/column
+    hdr_row, part_col = detect_header(df0)
+    log.info("Header detected at row=%s, particulars_col=%s", hdr_row, part_col)
+
+    # Rows above header where Outlet/Manager live (adjust if needed)
+    outlet_row  = max(hdr_row - 1, 0)   # often the outlet names
+    manager_row = max(hdr_row - 3, 0)   # often the managers
+
+    # Build headered DataFrame from hdr_row
+    df_after = df0.iloc[hdr_row:, :].copy()
+
+    # Build a parallel array of original column indices
+    orig_idx_full = np.arange(df0.shape[1])
+    orig_idx_after = orig_idx_full.copy()
+
+    # Set header from the first row of df_after
+    df_after.columns = df_after.iloc[0]
+    df_after = df_after.iloc[1:].reset_index(drop=True)
+
+    # Slice columns from 'Particulars' **by position**
+    df_after = df_after.iloc[:, part_col:].copy()
+    orig_idx_after = orig_idx_after[part_col:]  # keep the same slice for the index map
+
+    # Rename first column to 'Particulars'
+    new_cols = list(df_after.columns)
+    new_cols[0] = "Particulars"
+    df_after.columns = new_cols
+
+    # Compute a mask of entirely empty columns (over the data area)
+    # Be more conservative - only remove columns that are completely empty AND don't have month patterns
+    # (an empty month or % column might still be an outlet column)
+    # The labels are normalized and matched once; the masks are reused for block detection
+    col_norm = norm_series(pd.Index(df_after.columns, dtype=object).fillna("").astype(str))
+    month_mask = np.asarray(col_norm.str.match(_MONTH_RE), dtype=bool)
+    pct_mask = np.asarray(col_norm.str.match(_PCT_RE), dtype=bool)
+    empty_cols_mask = df_after.isna().all(axis=0).values & ~(month_mask | pct_mask)
+
+    # Apply the same mask to BOTH df_after and the index map (and the label masks)
+    df_after = df_after.loc[:, ~empty_cols_mask].copy()
+    orig_idx_after = orig_idx_after[~empty_cols_mask]
+    month_mask = month_mask[~empty_cols_mask]
+    pct_mask = pct_mask[~empty_cols_mask]
+
+    log.info("After filtering empty columns: %s", df_after.shape)
+
+    # Filter required metrics
+    required_rows = [
+        "Direct Income",
+        "TOTAL REVENUE",
+        "COGS",
+        "Outlet Expenses",
+        "EBIDTA",
+        "Finance Cost",
+        "01-Bank Charges",
+        "02-Interest on Borrowings",
+        "03-Interest on Vehicle Loan",
+        "04-MG",
+        "PBT",
+        "WASTAGE",
+    ]
+
+    # Normalize the whole column with the vectorized string kernels and test membership
+    # against a hashed set
+    df_after["Particulars"] = norm_series(df_after["Particulars"].astype(str))
+    df_req = df_after[df_after["Particulars"].isin(frozenset(required_rows))].reset_index(drop=True)
+
+    log.info("Found %d required metric rows", len(df_req))
+
+    if df_req.empty:
+        available_particulars = df_after["Particulars"].dropna().unique()[:30]
+        log.debug("Available 'Particulars' values (first 30): %s", available_particulars)
+
+        # Try to find similar matches
+        log.debug("Looking for similar matches...")
+        for req_row in required_rows:
+            matches = [p for p in available_particulars if req_row.lower() in str(p).lower()]
+            if matches:
+                log.debug("  '%s' might match: %s", req_row, matches)
+
+        raise ValueError("None of the required rows were found under 'Particulars'.")
+
+    # Detect all outlet (Month, %) column pairs by **position** - AFTER filtering
+    cols = list(df_after.columns)  # Use df_after (after empty column filtering) instead of df_req
+
+    # Column i starts a block when it is a month and column i+1 is a % (0 is 'Particulars')
+    block_starts = np.flatnonzero(month_mask[1:-1] & pct_mask[2:]) + 1
+    outlet_blocks = [(int(i), cols[i], cols[i+1]) for i in block_starts]
+
+    log.info("Found %d outlet blocks", len(outlet_blocks))
+
+    if not outlet_blocks:
+        log.debug("Columns after 'Particulars': %s ... total: %d", cols[:20], len(cols))
+        log.debug("Looking for month patterns...")
+        for i, col in enumerate(cols[1:6]):  # Check first 5 columns after Particulars
+            log.debug("  Column %d: '%s' -> month_match: %s", i + 1, col, bool(_MONTH_RE.match(norm_str(col))))
+        raise ValueError("No Month/% pairs detected (e.g., 'June-25' followed by '%').")
+
+    # Build final rows
+    # Metric names and the value grid as arrays; metrics for all outlets are one slice
+    particulars = df_req["Particulars"].to_numpy()
+    req_values = df_req.to_numpy()
+    # Outlet/Manager names only live above the header: normalize that block once
+    name_cells = norm_cells(df0.iloc[:outlet_row + 1])
+    val_idxs, outlets, managers, months = [], [], [], []
+    skipped_count = 0
+
+    for (val_idx, val_col_name, pct_col_name) in outlet_blocks:
+        # Map df_after column position -> original df0 column index
+        # val_idx now corresponds directly to orig_idx_after since we used df_after.columns
+        orig_col_idx = int(orig_idx_after[val_idx])
+
+        # Outlet / Manager via robust scanning
+        outlet_name  = get_name(name_cells, outlet_row,  orig_col_idx, max_up=6, max_dx=2)
+        manager_name = get_name(name_cells, manager_row, orig_col_idx, max_up=8, max_dx=2)
+
+        # Skip consolidated summary column if it happens to be detected
+        if outlet_name.lower() == "consolidated summary" or "consolidated" in outlet_name.lower():
+            skipped_count += 1
+            continue
+
+        # Month label
+        month_label = norm_str(val_col_name)
+        month = month_label.split("-")[0] if "-" in month_label else month_label
+
+        val_idxs.append(val_idx)
+        outlets.append(outlet_name)
+        managers.append(manager_name)
+        months.append(month)
+
+        # Note: Zero revenue outlets are now correctly included in calculations
+
+    # Copy metrics by position: (outlets x metrics) in one column slice.
+    # A metric listed twice keeps its last row, as the per-row dict build did
+    # infer_objects types the all-number columns in one pass so only the leftovers need to_numeric
+    df_final = pd.DataFrame(req_values[:, val_idxs].T, columns=particulars).infer_objects()
+    df_final = df_final.loc[:, ~df_final.columns.duplicated(keep="last")]
+    df_final.insert(0, "Month", months)
+    df_final.insert(0, "Outlet Manager", managers)
+    df_final.insert(0, "Outlet", outlets)
+
+    log.info("Created %d final outlet records", len(df_final))
+    log.info("Skipped %d consolidated outlets", skipped_count)
+    log.info("Total outlet blocks processed: %d", len(outlet_blocks))
+
+    # Order + numeric coercion
+    required_order = [
+        "Outlet", "Outlet Manager", "Month",
+        "Direct Income", "TOTAL REVENUE", "COGS", "Outlet Expenses",
+        "EBIDTA", "Finance Cost",
+        "01-Bank Charges", "02-Interest on Borrowings",
+        "03-Interest on Vehicle Loan", "04-MG",
+        "PBT", "WASTAGE"
+    ]
+    for c in required_order:
+        if c not in df_final.columns:
+            df_final[c] = np.nan
+    df_final = df_final[required_order].copy()
+
+    # Only columns still holding text/blanks go through to_numeric ('-' etc. become NaN)
+    num_cols = [c for c in required_order
+                if c not in ("Outlet", "Outlet Manager", "Month")
+                and not pd.api.types.is_numeric_dtype(df_final[c])]
+    if num_cols:
+        df_final[num_cols] = df_final[num_cols].apply(pd.to_numeric, errors="coerce")
+
+    return df_final
+
+def process_outlet_wise_worksheet(wb):
     """
     Process the 'Outlet wise' worksheet from multi-sheet files (same format as data5.xlsx)
+    'wb' is the read-only workbook already opened by process_financial_data
     """
     try:
-        print("[INFO] Processing 'Outlet wise' worksheet")
+        log.info("Processing 'Outlet wise' worksheet")
         
         # Read the "Outlet wise" worksheet with no header to preserve raw layout
         # Limit to first 1000 rows for performance
-        df0 = pd.read_excel(file_path, sheet_name="Outlet wise", header=None, engine="openpyxl", nrows=1000)
-        print(f"[INFO] Raw data shape (limited to 1000 rows): {df0.shape}")
+        df0 = read_raw_sheet(wb, "Outlet wise")
+        log.info("Raw data shape (limited to %d rows): %s", RAW_ROW_LIMIT, df0.shape)
         
-        # Detect header row/column using existing logic
-        hdr_row, part_col = detect_header(df0)
-        print(f"[INFO] Header detected at row={hdr_row}, particulars_col={part_col}")
-
-        # Rows above header where Outlet/Manager live
-        outlet_row = max(hdr_row - 1, 0)   # often the outlet names
-        manager_row = max(hdr_row - 3, 0)  # often the managers
-
-        # Build headered DataFrame from hdr_row
-        df_after = df0.iloc[hdr_row:, :].copy()
-
-        # Build a parallel array of original column indices
-        orig_idx_full = np.arange(df0.shape[1])
-        orig_idx_after = orig_idx_full.copy()
-
-        # Set header from the first row of df_after
-        df_after.columns = df_after.iloc[0]
-        df_after = df_after.iloc[1:].reset_index(drop=True)
-
-        # Slice columns from 'Particulars' **by position**
-        df_after = df_after.iloc[:, part_col:].copy()
-        orig_idx_after = orig_idx_after[part_col:]  # keep the same slice for the index map
-
-        # Rename first column to 'Particulars'
-        new_cols = list(df_after.columns)
-        new_cols[0] = "Particulars"
-        df_after.columns = new_cols
-
-        # Compute a mask of entirely empty columns (over the data area)
-        empty_cols_mask = df_after.isna().all(axis=0).values
-        
-        # Additional check: don't remove columns that might be outlet columns (have month patterns)
-        month_re = re.compile(r"^[A-Za-z]+-\d{2}(?:\.\d+)?$")
-        pct_re = re.compile(r"^%(?:\.\d+)?$")
-        
-        for i, col in enumerate(df_after.columns):
-            if empty_cols_mask[i]:  # If column is empty
-                col_name = norm_str(col)
-                # Don't remove if it looks like a month column or % column
-                if month_re.match(col_name) or pct_re.match(col_name):
-                    empty_cols_mask[i] = False
-        
-        # Apply the same mask to BOTH df_after and the index map
-        df_after = df_after.loc[:, ~empty_cols_mask].copy()
-        orig_idx_after = orig_idx_after[~empty_cols_mask]
-
-        print(f"[INFO] After filtering empty columns: {df_after.shape}")
-
-        # Filter required metrics
-        required_rows = [
-            "Direct Income",
-            "TOTAL REVENUE",
-            "COGS",
-            "Outlet Expenses",
-            "EBIDTA",
-            "Finance Cost",
-            "01-Bank Charges",
-            "02-Interest on Borrowings",
-            "03-Interest on Vehicle Loan",
-            "04-MG",
-            "PBT",
-            "WASTAGE",
-        ]
-        
-        df_after["Particulars"] = df_after["Particulars"].astype(str).apply(norm_str)
-        df_req = df_after[df_after["Particulars"].isin(required_rows)].reset_index(drop=True)
-        
-        print(f"[INFO] Found {len(df_req)} required metric rows")
-        
-        if df_req.empty:
-            print("DEBUG — Available 'Particulars' values (first 30):")
-            available_particulars = df_after["Particulars"].dropna().unique()[:30]
-            print(available_particulars)
-            
-            # Try to find similar matches
-            print("DEBUG — Looking for similar matches...")
-            for req_row in required_rows:
-                matches = [p for p in available_particulars if req_row.lower() in str(p).lower()]
-                if matches:
-                    print(f"  '{req_row}' might match: {matches}")
-            
-            raise ValueError("None of the required rows were found under 'Particulars'.")
-
-        # Detect all outlet (Month, %) column pairs by **position** - AFTER filtering
-        cols = list(df_after.columns)  # Use df_after (after empty column filtering) instead of df_req
-        month_re = re.compile(r"^[A-Za-z]+-\d{2}(?:\.\d+)?$")
-        pct_re   = re.compile(r"^%(?:\.\d+)?$")
-
-        outlet_blocks = []
-        for i in range(1, len(cols) - 1):  # 0 is 'Particulars'
-            cname = norm_str(cols[i])
-            nname = norm_str(cols[i+1])
-            if month_re.match(cname) and (nname == "%" or pct_re.match(nname)):
-                outlet_blocks.append((i, cols[i], cols[i+1]))
-
-        print(f"[INFO] Found {len(outlet_blocks)} outlet blocks")
-
-        if not outlet_blocks:
-            print("DEBUG — Columns after 'Particulars':", cols[:20], " ... total:", len(cols))
-            print("DEBUG — Looking for month patterns...")
-            for i, col in enumerate(cols[1:6]):  # Check first 5 columns after Particulars
-                print(f"  Column {i+1}: '{col}' -> month_match: {bool(month_re.match(norm_str(col)))}")
-            raise ValueError("No Month/% pairs detected (e.g., 'June-25' followed by '%').")
-
-        # Build final rows
-        final_rows = []
-        skipped_count = 0
-
-        for (val_idx, val_col_name, pct_col_name) in outlet_blocks:
-            # Map df_after column position -> original df0 column index
-            orig_col_idx = int(orig_idx_after[val_idx])
-
-            # Outlet / Manager via robust scanning
-            outlet_name  = get_name(df0, outlet_row,  orig_col_idx, max_up=6, max_dx=2)
-            manager_name = get_name(df0, manager_row, orig_col_idx, max_up=8, max_dx=2)
-
-            # Skip consolidated summary column if it happens to be detected
-            if outlet_name.lower() == "consolidated summary" or "consolidated" in outlet_name.lower():
-                skipped_count += 1
-                continue
-
-            # Month label
-            month_label = norm_str(val_col_name)
-            month = month_label.split("-")[0] if "-" in month_label else month_label
-
-            row = {
-                "Outlet": outlet_name,
-                "Outlet Manager": manager_name,
-                "Month": month
-            }
-
-            # Copy metrics by position
-            for _, req_row in df_req.iterrows():
-                metric = req_row["Particulars"]
-                value  = req_row.iat[val_idx] if val_idx < df_req.shape[1] else np.nan
-                row[metric] = value
-
-            final_rows.append(row)
-
-        df_final = pd.DataFrame(final_rows)
-        print(f"[INFO] Created {len(df_final)} final outlet records")
-        print(f"[INFO] Skipped {skipped_count} consolidated outlets")
-        print(f"[INFO] Total outlet blocks processed: {len(outlet_blocks)}")
-
-        # Order + numeric coercion
-        required_order = [
-            "Outlet", "Outlet Manager", "Month",
-            "Direct Income", "TOTAL REVENUE", "COGS", "Outlet Expenses",
-            "EBIDTA", "Finance Cost",
-            "01-Bank Charges", "02-Interest on Borrowings",
-            "03-Interest on Vehicle Loan", "04-MG",
-            "PBT", "WASTAGE"
-        ]
-        for c in required_order:
-            if c not in df_final.columns:
-                df_final[c] = np.nan
-        df_final = df_final[required_order].copy()
-
-        num_cols = [c for c in required_order if c not in ("Outlet", "Outlet Manager", "Month")]
-        df_final[num_cols] = df_final[num_cols].apply(pd.to_numeric, errors="coerce")
+        df_final = extract_outlet_records(df0)
 
         # Convert to list of dictionaries for JSON serialization
-        df_final_clean = df_final.replace({np.nan: None})
-        result_data = df_final_clean.to_dict('records')
+        # (NaN is left in place - orjson encodes it as null)
+        result_data = df_final.to_dict('records')
         
         return {
             "success": True,
@@ -312,18 +506,14 @@ def process_outlet_wise_worksheet(file_path):
         }
 
     except Exception as e:
-        return {
-            "success": False,
-            "error": f"Outlet wise worksheet processing failed: {str(e)}",
-            "traceback": traceback.format_exc()
-        }
+        return error_result(f"Outlet wise worksheet processing failed: {str(e)}")
 
 def process_multi_worksheet_outlets(file_path, outlet_sheets):
     """
     Process multi-worksheet outlet files where each outlet has its own sheet
     """
     try:
-        print(f"[INFO] Processing {len(outlet_sheets)} outlet sheets from multi-worksheet file")
+        log.info("Processing %d outlet sheets from multi-worksheet file", len(outlet_sheets))
         
         all_outlet_data = []
         processed_outlets = 0
@@ -347,14 +537,14 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
         
         for sheet_name in outlet_sheets:
             try:
-                print(f"[INFO] Processing outlet sheet: {sheet_name}")
+                log.info("Processing outlet sheet: %s", sheet_name)
                 
                 # Read the sheet with no header to preserve raw layout
                 df_raw = pd.read_excel(file_path, sheet_name=sheet_name, header=None, engine='openpyxl')
                 
                 # Find the header row containing "Particulars"
                 hdr_row, part_col = detect_header(df_raw)
-                print(f"[INFO] Header found at row {hdr_row}, column {part_col} for {sheet_name}")
+                log.info("Header found at row %s, column %s for %s", hdr_row, part_col, sheet_name)
                 
                 # Extract outlet name and manager from the sheet
                 # Look for outlet name in the first few rows
@@ -385,14 +575,14 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
                 if not manager_name:
                     manager_name = sheet_name
                 
-                print(f"[INFO] Extracted - Outlet: {outlet_name}, Manager: {manager_name}")
+                log.info("Extracted - Outlet: %s, Manager: %s", outlet_name, manager_name)
                 
                 # Process the financial data from this sheet
                 df_after = df_raw.iloc[hdr_row:, :].copy()
                 
                 # Check if we have enough rows
                 if df_after.shape[0] < 2:
-                    print(f"[WARNING] Not enough data rows in sheet {sheet_name}")
+                    log.warning("Not enough data rows in sheet %s", sheet_name)
                     failed_outlets += 1
                     continue
                 
@@ -402,16 +592,16 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
                 
                 # Check if 'Particulars' column exists
                 if 'Particulars' not in df_after.columns:
-                    print(f"[WARNING] 'Particulars' column not found in sheet {sheet_name}")
+                    log.warning("'Particulars' column not found in sheet %s", sheet_name)
                     failed_outlets += 1
                     continue
                 
                 # Filter to get only the required metrics
-                df_after["Particulars"] = df_after["Particulars"].astype(str).apply(norm_str)
-                df_metrics = df_after[df_after["Particulars"].isin(required_metrics)].reset_index(drop=True)
+                df_after["Particulars"] = norm_series(df_after["Particulars"].astype(str))
+                df_metrics = df_after[df_after["Particulars"].isin(frozenset(required_metrics))].reset_index(drop=True)
                 
                 if df_metrics.empty:
-                    print(f"[WARNING] No required metrics found in sheet {sheet_name}")
+                    log.warning("No required metrics found in sheet %s", sheet_name)
                     failed_outlets += 1
                     continue
                 
@@ -430,8 +620,8 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
                             continue
                 
                 if data_column is None:
-                    print(f"[WARNING] No numeric data column found in sheet {sheet_name}")
-                    print(f"[DEBUG] Available columns: {list(df_metrics.columns)}")
+                    log.warning("No numeric data column found in sheet %s", sheet_name)
+                    log.debug("Available columns: %s", list(df_metrics.columns))
                     failed_outlets += 1
                     continue
                 
@@ -458,14 +648,14 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
                 
                 all_outlet_data.append(outlet_record)
                 processed_outlets += 1
-                print(f"[INFO] Successfully processed {sheet_name} - Revenue: {outlet_record.get('TOTAL REVENUE', 0)}")
+                log.info("Successfully processed %s - Revenue: %s", sheet_name, outlet_record.get('TOTAL REVENUE', 0))
                 
             except Exception as sheet_error:
-                print(f"[ERROR] Failed to process sheet {sheet_name}: {str(sheet_error)}")
+                log.error("Failed to process sheet %s: %s", sheet_name, sheet_error)
                 failed_outlets += 1
                 continue
         
-        print(f"[INFO] Multi-worksheet processing complete: {processed_outlets} outlets processed, {failed_outlets} failed")
+        log.info("Multi-worksheet processing complete: %d outlets processed, %d failed", processed_outlets, failed_outlets)
         
         if not all_outlet_data:
             raise ValueError("No outlet data could be extracted from any worksheet")
@@ -491,8 +681,8 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
         df_final = df_final[required_order].copy()
         
         # Convert to list of dictionaries for JSON serialization
-        df_final_clean = df_final.replace({np.nan: None})
-        result_data = df_final_clean.to_dict('records')
+        # (NaN is left in place - orjson encodes it as null)
+        result_data = df_final.to_dict('records')
         
         return {
             "success": True,
@@ -504,48 +694,55 @@ def process_multi_worksheet_outlets(file_path, outlet_sheets):
         }
         
     except Exception as e:
-        return {
-            "success": False,
-            "error": f"Multi-worksheet processing failed: {str(e)}",
-            "traceback": traceback.format_exc()
-        }
+        return error_result(f"Multi-worksheet processing failed: {str(e)}")
 
 def process_financial_data(file_path):
     """
     Process financial data using the logic from data_backend.py
+    ('file_path' may also be a seekable binary file object, e.g. an upload stream)
     """
+    wb = None
     try:
+        # Open the workbook once; every format probe below streams from this handle
+        wb = open_workbook(file_path)
+
         # First, check if this file has an "Outlet wise" worksheet (like Outlet PL June-25.xlsx)
         try:
             # Read all sheet names to check for "Outlet wise" worksheet
-            xl_file = pd.ExcelFile(file_path, engine='openpyxl')
-            sheet_names = xl_file.sheet_names
+            # (read-only mode only parses the workbook index, not the sheets)
+            sheet_names = wb.sheetnames
             
-            print(f"[INFO] Found {len(sheet_names)} worksheets: {sheet_names}")
+            log.info("Found %d worksheets: %s", len(sheet_names), sheet_names)
             
             # Check if "Outlet wise" worksheet exists
             if "Outlet wise" in sheet_names:
-                print("[INFO] Found 'Outlet wise' worksheet, processing it directly")
-                return process_outlet_wise_worksheet(file_path)
+                log.info("Found 'Outlet wise' worksheet, processing it directly")
+                return process_outlet_wise_worksheet(wb)
             
         except Exception as multi_error:
-            print(f"[INFO] Multi-worksheet detection failed, trying single sheet: {multi_error}")
+            log.info("Multi-worksheet detection failed, trying single sheet: %s", multi_error)
         
         # First, try to read as a clean outlet-based format (like data5.xlsx)
         try:
-            df_clean = pd.read_excel(file_path, engine="openpyxl")
+            # Only the header row is needed to recognise the clean format, so stream it
+            # instead of parsing the whole first sheet for raw layouts
+            clean_columns = read_header_row(wb)
             
             # Check if this is already in the clean format (outlets as rows)
             # Also check for financial metrics to ensure it's a complete clean format
-            has_outlet_col = 'Outlet' in df_clean.columns
-            has_manager_col = 'Outlet Manager' in df_clean.columns
-            has_financial_metrics = any(col in df_clean.columns for col in ['TOTAL REVENUE', 'Direct Income', 'COGS', 'EBIDTA'])
+            has_outlet_col = 'Outlet' in clean_columns
+            has_manager_col = 'Outlet Manager' in clean_columns
+            has_financial_metrics = any(col in clean_columns for col in ['TOTAL REVENUE', 'Direct Income', 'COGS', 'EBIDTA'])
             
-            print(f"[DEBUG] Clean format detection: has_outlet_col={has_outlet_col}, has_manager_col={has_manager_col}, has_financial_metrics={has_financial_metrics}")
-            print(f"[DEBUG] Available columns: {list(df_clean.columns)}")
+            log.debug("Clean format detection: has_outlet_col=%s, has_manager_col=%s, has_financial_metrics=%s",
+                      has_outlet_col, has_manager_col, has_financial_metrics)
+            log.debug("Available columns: %s", clean_columns)
             
             if has_outlet_col and has_manager_col and has_financial_metrics:
-                print("[INFO] Detected clean outlet-based format")
+                log.info("Detected clean outlet-based format")
+                # pd.read_excel would close the ExcelFile it wraps around wb, and with it
+                # the shared workbook the raw fallback below still needs
+                df_clean = pd.ExcelFile(wb, engine="openpyxl").parse()
                 
                 # Process the clean format directly
                 df_final = df_clean.copy()
@@ -566,8 +763,12 @@ def process_financial_data(file_path):
                 df_final = df_final[required_columns].copy()
                 
                 # Convert numeric columns
-                numeric_cols = [c for c in required_columns if c not in ("Outlet", "Outlet Manager", "Month")]
-                df_final[numeric_cols] = df_final[numeric_cols].apply(pd.to_numeric, errors="coerce")
+                # (columns read_excel already typed as numbers are left alone)
+                numeric_cols = [c for c in required_columns
+                                if c not in ("Outlet", "Outlet Manager", "Month")
+                                and not pd.api.types.is_numeric_dtype(df_final[c])]
+                if numeric_cols:
+                    df_final[numeric_cols] = df_final[numeric_cols].apply(pd.to_numeric, errors="coerce")
                 
                 # Filter out only consolidated summary outlets (include all outlets regardless of revenue)
                 df_final_filtered = df_final[
@@ -575,9 +776,8 @@ def process_financial_data(file_path):
                 ].copy()
                 
                 # Convert to list of dictionaries for JSON serialization
-                # Replace NaN values with None for proper JSON serialization
-                df_final_clean = df_final_filtered.replace({np.nan: None})
-                result_data = df_final_clean.to_dict('records')
+                # (NaN is left in place - orjson encodes it as null)
+                result_data = df_final_filtered.to_dict('records')
                 
                 return {
                     "success": True,
@@ -587,196 +787,23 @@ def process_financial_data(file_path):
                 }
                 
         except Exception as clean_error:
-            print(f"[INFO] Clean format failed, trying raw format: {clean_error}")
-            print(f"[DEBUG] Clean format error details: {str(clean_error)}")
-            import traceback
-            print(f"[DEBUG] Clean format traceback: {traceback.format_exc()}")
+            log.info("Clean format failed, trying raw format: %s", clean_error)
+            # exc_info is only formatted when DEBUG records are actually emitted
+            log.debug("Clean format error details", exc_info=True)
         
         # If clean format fails, try the original raw processing logic
-        print("[INFO] Trying raw format processing...")
+        log.info("Trying raw format processing...")
         
         # Read workbook with NO header (keep raw layout)
         # For large files, limit the number of rows to process
-        df0 = pd.read_excel(file_path, header=None, engine="openpyxl", nrows=1000)
-        print(f"[INFO] Raw data shape (limited to 1000 rows): {df0.shape}")
-        
-        # Detect header row/column
-        hdr_row, part_col = detect_header(df0)
-        print(f"[INFO] Header detected at row={hdr_row}, particulars_col={part_col}")
-
-        # Rows above header where Outlet/Manager live (adjust if needed)
-        outlet_row  = max(hdr_row - 1, 0)   # often the outlet names
-        manager_row = max(hdr_row - 3, 0)   # often the managers
-
-        # Build headered DataFrame from hdr_row
-        df_after = df0.iloc[hdr_row:, :].copy()
-
-        # Build a parallel array of original column indices
-        orig_idx_full = np.arange(df0.shape[1])
-        orig_idx_after = orig_idx_full.copy()
-
-        # Set header from the first row of df_after
-        df_after.columns = df_after.iloc[0]
-        df_after = df_after.iloc[1:].reset_index(drop=True)
-
-        # Slice columns from 'Particulars' **by position**
-        df_after = df_after.iloc[:, part_col:].copy()
-        orig_idx_after = orig_idx_after[part_col:]  # keep the same slice for the index map
-
-        # Rename first column to 'Particulars'
-        new_cols = list(df_after.columns)
-        new_cols[0] = "Particulars"
-        df_after.columns = new_cols
-
-        # Compute a mask of entirely empty columns (over the data area)
-        # Be more conservative - only remove columns that are completely empty AND don't have month patterns
-        empty_cols_mask = df_after.isna().all(axis=0).values
+        df0 = read_raw_sheet(wb)
+        log.info("Raw data shape (limited to %d rows): %s", RAW_ROW_LIMIT, df0.shape)
         
-        # Additional check: don't remove columns that might be outlet columns (have month patterns)
-        month_re = re.compile(r"^[A-Za-z]+-\d{2}(?:\.\d+)?$")
-        pct_re = re.compile(r"^%(?:\.\d+)?$")
-        
-        for i, col in enumerate(df_after.columns):
-            if empty_cols_mask[i]:  # If column is empty
-                col_name = norm_str(col)
-                # Don't remove if it looks like a month column or % column
-                if month_re.match(col_name) or pct_re.match(col_name):
-                    empty_cols_mask[i] = False
-        
-        # Apply the same mask to BOTH df_after and the index map
-        df_after = df_after.loc[:, ~empty_cols_mask].copy()
-        orig_idx_after = orig_idx_after[~empty_cols_mask]
-
-        print(f"[INFO] After filtering empty columns: {df_after.shape}")
-
-        # Filter required metrics
-        required_rows = [
-            "Direct Income",
-            "TOTAL REVENUE",
-            "COGS",
-            "Outlet Expenses",
-            "EBIDTA",
-            "Finance Cost",
-            "01-Bank Charges",
-            "02-Interest on Borrowings",
-            "03-Interest on Vehicle Loan",
-            "04-MG",
-            "PBT",
-            "WASTAGE",
-        ]
-        
-        # Additional interest-related metrics for better analysis
-        interest_metrics = [
-            "01-Bank Charges",
-            "02-Interest on Borrowings", 
-            "03-Interest on Vehicle Loan",
-            "04-MG",
-            "Finance Cost"
-        ]
-        df_after["Particulars"] = df_after["Particulars"].astype(str).apply(norm_str)
-        df_req = df_after[df_after["Particulars"].isin(required_rows)].reset_index(drop=True)
-        
-        print(f"[INFO] Found {len(df_req)} required metric rows")
-        
-        if df_req.empty:
-            print("DEBUG — Available 'Particulars' values (first 30):")
-            available_particulars = df_after["Particulars"].dropna().unique()[:30]
-            print(available_particulars)
-            
-            # Try to find similar matches
-            print("DEBUG — Looking for similar matches...")
-            for req_row in required_rows:
-                matches = [p for p in available_particulars if req_row.lower() in str(p).lower()]
-                if matches:
-                    print(f"  '{req_row}' might match: {matches}")
-            
-            raise ValueError("None of the required rows were found under 'Particulars'.")
-
-        # Detect all outlet (Month, %) column pairs by **position** - AFTER filtering
-        cols = list(df_after.columns)  # Use df_after (after empty column filtering) instead of df_req
-        month_re = re.compile(r"^[A-Za-z]+-\d{2}(?:\.\d+)?$")
-        pct_re   = re.compile(r"^%(?:\.\d+)?$")
-
-        outlet_blocks = []
-        for i in range(1, len(cols) - 1):  # 0 is 'Particulars'
-            cname = norm_str(cols[i])
-            nname = norm_str(cols[i+1])
-            if month_re.match(cname) and (nname == "%" or pct_re.match(nname)):
-                outlet_blocks.append((i, cols[i], cols[i+1]))
-
-        print(f"[INFO] Found {len(outlet_blocks)} outlet blocks")
-
-        if not outlet_blocks:
-            print("DEBUG — Columns after 'Particulars':", cols[:20], " ... total:", len(cols))
-            print("DEBUG — Looking for month patterns...")
-            for i, col in enumerate(cols[1:6]):  # Check first 5 columns after Particulars
-                print(f"  Column {i+1}: '{col}' -> month_match: {bool(month_re.match(norm_str(col)))}")
-            raise ValueError("No Month/% pairs detected (e.g., 'June-25' followed by '%').")
-
-        # Build final rows
-        final_rows = []
-        skipped_count = 0
-
-        for (val_idx, val_col_name, pct_col_name) in outlet_blocks:
-            # Map df_after column position -> original df0 column index
-            # val_idx now corresponds directly to orig_idx_after since we used df_after.columns
-            orig_col_idx = int(orig_idx_after[val_idx])
-
-            # Outlet / Manager via robust scanning
-            outlet_name  = get_name(df0, outlet_row,  orig_col_idx, max_up=6, max_dx=2)
-            manager_name = get_name(df0, manager_row, orig_col_idx, max_up=8, max_dx=2)
-
-            # Skip consolidated summary column if it happens to be detected
-            if outlet_name.lower() == "consolidated summary" or "consolidated" in outlet_name.lower():
-                skipped_count += 1
-                continue
-
-            # Month label
-            month_label = norm_str(val_col_name)
-            month = month_label.split("-")[0] if "-" in month_label else month_label
-
-            row = {
-                "Outlet": outlet_name,
-                "Outlet Manager": manager_name,
-                "Month": month
-            }
-
-            # Copy metrics by position
-            for _, req_row in df_req.iterrows():
-                metric = req_row["Particulars"]
-                value  = req_row.iat[val_idx] if val_idx < df_req.shape[1] else np.nan
-                row[metric] = value
-
-            # Note: Zero revenue outlets are now correctly included in calculations
-
-            final_rows.append(row)
-
-        df_final = pd.DataFrame(final_rows)
-        print(f"[INFO] Created {len(df_final)} final outlet records")
-        print(f"[INFO] Skipped {skipped_count} consolidated outlets")
-        print(f"[INFO] Total outlet blocks processed: {len(outlet_blocks)}")
-
-        # Order + numeric coercion
-        required_order = [
-            "Outlet", "Outlet Manager", "Month",
-            "Direct Income", "TOTAL REVENUE", "COGS", "Outlet Expenses",
-            "EBIDTA", "Finance Cost",
-            "01-Bank Charges", "02-Interest on Borrowings",
-            "03-Interest on Vehicle Loan", "04-MG",
-            "PBT", "WASTAGE"
-        ]
-        for c in required_order:
-            if c not in df_final.columns:
-                df_final[c] = np.nan
-        df_final = df_final[required_order].copy()
-
-        num_cols = [c for c in required_order if c not in ("Outlet", "Outlet Manager", "Month")]
-        df_final[num_cols] = df_final[num_cols].apply(pd.to_numeric, errors="coerce")
+        df_final = extract_outlet_records(df0)
 
         # Convert to list of dictionaries for JSON serialization
-        # Replace NaN values with None for proper JSON serialization
-        df_final_clean = df_final.replace({np.nan: None})
-        result_data = df_final_clean.to_dict('records')
+        # (NaN is left in place - orjson encodes it as null)
+        result_data = df_final.to_dict('records')
         
         return {
             "success": True,
@@ -786,19 +813,17 @@ def process_financial_data(file_path):
         }
 
     except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "traceback": traceback.format_exc()
-        }
+        return error_result(str(e))
+    finally:
+        if wb is not None:
+            wb.close()
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({
+    return json_response({
         "status": "healthy", 
         "message": "Backend API is running",
-        "environment": "serverless" if IS_SERVERLESS else "local",
-        "upload_folder": UPLOAD_FOLDER
+        "environment": "serverless" if IS_SERVERLESS else "local"
     })
 
 @app.route('/process-file', methods=['POST'])
@@ -806,7 +831,7 @@ def process_file():
     try:
         # Check if file is present
         if 'file' not in request.files:
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "No file provided"
             }), 400
@@ -814,58 +839,31 @@ def process_file():
         file = request.files['file']
         
         if file.filename == '':
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "No file selected"
             }), 400
 
         if not allowed_file(file.filename):
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "File type not allowed. Please upload Excel files (.xlsx, .xls)"
             }), 400
 
-        # Save uploaded file temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, filename)
-        
-        try:
-            file.save(temp_path)
-        except Exception as save_error:
-            return jsonify({
-                "success": False,
-                "error": f"Failed to save file: {str(save_error)}",
-                "upload_folder": UPLOAD_FOLDER
-            }), 500
-
-        try:
-            # Process the file using our backend logic
-            result = process_financial_data(temp_path)
-            
-            # Clean up temporary file
-            try:
-                os.remove(temp_path)
-            except PermissionError:
-                # File might be in use, try to delete it later
-                print(f"[WARNING] Could not delete temporary file {temp_path} - file may be in use")
-            
-            return jsonify(result)
-
-        except Exception as e:
-            # Clean up temporary file on error
-            try:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            except PermissionError:
-                print(f"[WARNING] Could not delete temporary file {temp_path} - file may be in use")
-            raise e
+        # openpyxl reads the workbook straight from the upload bytes, so nothing is
+        # written to disk. Re-uploads of the same content are answered from the
+        # result cache without re-running the pipeline
+        content = file.read()
+        key = upload_digest(content)
+        result = get_cached_result(key)
+        if result is None:
+            result = process_financial_data(io.BytesIO(content))
+            if result.get("success"):
+                cache_result(key, result)
+        return json_response(result)
 
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": f"Processing failed: {str(e)}",
-            "traceback": traceback.format_exc()
-        }), 500
+        return json_response(error_result(f"Processing failed: {str(e)}")), 500
 
 @app.route('/interest-analysis', methods=['POST'])
 def interest_analysis():
@@ -873,14 +871,26 @@ def interest_analysis():
     Endpoint specifically for interest cost analysis
     """
     try:
-        data = request.get_json()
+        # orjson parses the raw body bytes directly (no decode to str first). A body that
+        # doesn't even mention the key is rejected before paying for the parse
+        body = request.get_data()
+        data = orjson.loads(body) if b'"financial_data"' in body else None
         if not data or 'financial_data' not in data:
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "No financial data provided"
             }), 400
 
         financial_data = data['financial_data']
+        n_outlets = len(financial_data)
+
+        # Optional: only return the top_k outlets with the lowest interest rate
+        top_k = data.get('top_k')
+        if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+            return json_response({
+                "success": False,
+                "error": "top_k must be a positive integer"
+            }), 400
         
         # Calculate interest analysis metrics
         interest_metrics = [
@@ -891,57 +901,64 @@ def interest_analysis():
             'Finance Cost'
         ]
         
-        # Calculate total interest costs
-        total_interest = 0
-        interest_breakdown = {}
-        
-        for metric in interest_metrics:
-            total_amount = sum(parse_float(item.get(metric, 0)) or 0 for item in financial_data)
-            if total_amount > 0:
-                interest_breakdown[metric] = {
-                    'total_amount': total_amount,
-                    'outlet_count': len([item for item in financial_data if item.get(metric, 0) and parse_float(item.get(metric, 0)) > 0]),
-                    'average_amount': total_amount / len(financial_data) if financial_data else 0
-                }
-                total_interest += total_amount
+        # Transpose the records once into one contiguous array per field (metrics, then
+        # TOTAL REVENUE) and aggregate with reductions instead of re-walking financial_data.
+        # values is the (outlets x metrics) view over those per-metric rows
+        fields = interest_metrics + ['TOTAL REVENUE']
+        parsed = parse_float_rows(
+            [[item.get(field, 0) or 0 for item in financial_data] for field in fields]
+        ).reshape(len(fields), n_outlets)
+        values = parsed[:-1].T
+        revenue = parsed[-1]
+        
+        # Calculate total interest costs: the breakdown comes straight from the column
+        # totals/counts (metrics with no cost are left out)
+        totals = values.sum(axis=0).tolist()
+        outlet_counts = (values > 0).sum(axis=0).tolist()
+        interest_breakdown = {
+            metric: {
+                'total_amount': total_amount,
+                'outlet_count': outlet_count,
+                'average_amount': total_amount / n_outlets if n_outlets else 0
+            }
+            for metric, total_amount, outlet_count in zip(interest_metrics, totals, outlet_counts)
+            if total_amount > 0
+        }
+        total_interest = sum(item['total_amount'] for item in interest_breakdown.values())
         
         # Calculate interest rates by outlet
-        outlet_analysis = []
-        for item in financial_data:
-            outlet = item.get('Outlet', 'Unknown')
-            manager = item.get('Outlet Manager', 'Unknown')
-            revenue = parse_float(item.get('TOTAL REVENUE', 0)) or 0
-            
-            outlet_interest = sum(parse_float(item.get(metric, 0)) or 0 for metric in interest_metrics)
-            interest_rate = (outlet_interest / revenue * 100) if revenue > 0 else 0
-            
-            outlet_analysis.append({
-                'outlet': outlet,
-                'manager': manager,
-                'total_interest': outlet_interest,
-                'revenue': revenue,
-                'interest_rate': interest_rate,
-                'interest_breakdown': {metric: parse_float(item.get(metric, 0)) or 0 for metric in interest_metrics}
-            })
-        
-        # Sort by interest rate for efficiency analysis
-        outlet_analysis.sort(key=lambda x: x['interest_rate'])
+        outlet_interest = values.sum(axis=1)
+        interest_rates = np.divide(outlet_interest, revenue, out=np.zeros_like(outlet_interest), where=revenue > 0) * 100
+        
+        # Sort by interest rate for efficiency analysis (stable, like list.sort) and
+        # emit the outlets already in that order; top_k keeps the same order, cut short
+        if top_k is not None and top_k < n_outlets:
+            order = stable_smallest(interest_rates, top_k)
+        else:
+            order = np.argsort(interest_rates, kind="stable")
+        outlet_analysis = [
+            {
+                'outlet': financial_data[i].get('Outlet', 'Unknown'),
+                'manager': financial_data[i].get('Outlet Manager', 'Unknown'),
+                'total_interest': float(outlet_interest[i]),
+                'revenue': float(revenue[i]),
+                'interest_rate': float(interest_rates[i]),
+                'interest_breakdown': dict(zip(interest_metrics, values[i].tolist()))
+            }
+            for i in order.tolist()
+        ]
         
-        return jsonify({
+        return json_response({
             "success": True,
             "total_interest_costs": total_interest,
             "interest_breakdown": interest_breakdown,
             "outlet_analysis": outlet_analysis,
-            "average_interest_rate": sum(item['interest_rate'] for item in outlet_analysis) / len(outlet_analysis) if outlet_analysis else 0,
-            "message": f"Interest analysis completed for {len(financial_data)} outlets"
+            "average_interest_rate": float(interest_rates.mean()) if n_outlets else 0,
+            "message": f"Interest analysis completed for {n_outlets} outlets"
         })
         
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": f"Interest analysis failed: {str(e)}",
-            "traceback": traceback.format_exc()
-        }), 500
+        return json_response(error_result(f"Interest analysis failed: {str(e)}")), 500
 
 if __name__ == '__main__':
     print("Starting Financial Data Processing API...")